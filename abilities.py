@@ -1,20 +1,53 @@
 # abilities.py - Flask Abilities Management
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import logging
 from flask_socketio import emit
 from flask import request
 import os
+import time
+import orjson
 
 logger = logging.getLogger(__name__)
 
 # Configuration
 CSHARP_API_URL = os.environ.get('CSHARP_API_URL', 'http://localhost:5001')
 API_KEY = os.environ.get('POKER_API_KEY', 'poker-game-api-key-2024')
-API_TIMEOUT = 30
+# Separate connect/read timeouts so a stuck backend fails fast instead of
+# pinning a worker for the full 30s scalar timeout
+CONNECT_TIMEOUT = float(os.environ.get('CSHARP_CONNECT_TIMEOUT', '2.0'))
+READ_TIMEOUT = float(os.environ.get('CSHARP_READ_TIMEOUT', '5.0'))
+
+# Shared session with keep-alive pooling - avoids a fresh TCP handshake per ability call
+_session = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=64,
+    max_retries=Retry(total=2, backoff_factor=0.1, status_forcelist=[502, 503, 504])
+)
+_session.mount('http://', _adapter)
+_session.mount('https://', _adapter)
+_session.headers.update({'X-API-Key': API_KEY})
+
+# Bound once in register_ability_events - importing game at module load
+# would be circular (game.py imports this module)
+active_games = None
+send_filtered_game_state = None
+
+def _bind_game_modules():
+    """Resolve the circular game/game_filter imports once at registration"""
+    global active_games, send_filtered_game_state
+    from game import active_games as _active_games
+    from game_filter import send_filtered_game_state as _send_filtered_game_state
+    active_games = _active_games
+    send_filtered_game_state = _send_filtered_game_state
 
 def register_ability_events(socketio):
     """Register ability-related WebSocket events"""
-    
+
+    _bind_game_modules()
+
     @socketio.on('use_ability')
     def handle_use_ability(data):
         """Handle ability usage requests from players"""
@@ -22,10 +55,7 @@ def register_ability_events(socketio):
         game_id = data.get('gameId')
         ability_type = data.get('ability', '').lower()
         
-        logger.info(f"Player {socket_id} using ability {ability_type} in game {game_id}")
-        
-        # Import game state
-        from game import active_games
+        logger.info("Player %s using ability %s in game %s", socket_id, ability_type, game_id)
         
         # Validate game exists
         if not game_id or game_id not in active_games:
@@ -44,28 +74,17 @@ def register_ability_events(socketio):
         player_index = player_info['player_index']
         username = player_info['username']
         
-        # Call C# API based on ability type
-        try:
-            if ability_type == 'peek':
-                handle_peek_ability(socketio, game_id, player_index, data)
-            elif ability_type == 'burn':
-                handle_burn_ability(socketio, game_id, player_index, data)  # FIXED: Added data parameter
-            elif ability_type == 'manifest':
-                handle_manifest_ability(socketio, game_id, player_index, data)
-            elif ability_type == 'trashman':
-                handle_trashman_ability(socketio, game_id, player_index, data)
-            elif ability_type == 'deadman':
-                handle_deadman_ability(socketio, game_id, player_index, data)  # FIXED: Added data parameter
-            elif ability_type == 'chaos':
-                handle_chaos_ability(socketio, game_id, player_index, data)  # FIXED: Added data parameter
-            elif ability_type == 'yoink':
-                handle_yoink_ability(socketio, game_id, player_index, data)
-            else:
-                emit('ability_error', {'error': f'Unknown ability: {ability_type}'})
-                
-        except Exception as e:
-            logger.error(f"Error processing ability {ability_type}: {e}")
-            emit('ability_error', {'error': 'Failed to process ability'})
+        # Reject obviously bad requests before paying for a C# round trip
+        error = _precheck_ability(ability_type, game, player_index, data)
+        if error:
+            emit('ability_error', {'error': error})
+            return
+
+        # Run the C# API call on a background task so a slow backend response
+        # doesn't block this worker's other socket events and broadcasts
+        socketio.start_background_task(
+            _run_ability, socketio, game_id, player_index, ability_type, data
+        )
     
     @socketio.on('cancel_ability')
     def handle_cancel_ability(data):
@@ -73,12 +92,84 @@ def register_ability_events(socketio):
         socket_id = request.sid
         game_id = data.get('gameId')
         
-        logger.info(f"Player {socket_id} cancelling ability in game {game_id}")
+        logger.info("Player %s cancelling ability in game %s", socket_id, game_id)
         
         # For now, just acknowledge cancellation
         # In a full implementation, you'd call the C# API to cancel pending choices
         emit('ability_cancelled', {'message': 'Ability cancelled'})
 
+def _precheck_ability(ability_type, game, player_index, data):
+    """Validate client-supplied choices against the stored game state.
+
+    Returns an error message for requests the C# API would reject anyway,
+    or None if the call should proceed. Only choices that are present are
+    checked - missing ones trigger the normal choice-request flow.
+    """
+    game_state = game.get('gameData', {})
+    if 'GameState' in game_state:
+        game_state = game_state['GameState']
+    players = game_state.get('Players', [])
+
+    if ability_type == 'peek':
+        card_index = data.get('cardIndex')
+        if card_index is not None and card_index not in (0, 1):
+            return 'Invalid card index'
+
+        target_player_id = data.get('targetPlayerId')
+        if target_player_id is not None:
+            if target_player_id == player_index + 1:
+                return 'Cannot peek at your own cards'
+            target = next((p for p in players if p.get('Id') == target_player_id), None)
+            if target is None:
+                return 'Target player not found'
+            if target.get('IsFolded', False):
+                return 'Target player has folded'
+
+    elif ability_type == 'yoink':
+        board_index = data.get('targetPlayerId')  # board card index (API field name)
+        if board_index is not None:
+            board = game_state.get('Board', [])
+            if not isinstance(board_index, int) or not 0 <= board_index < len(board):
+                return 'Invalid board card index'
+
+        card_index = data.get('cardIndex')
+        if card_index is not None and player_index < len(players):
+            hole_cards = players[player_index].get('HoleCards', [])
+            if not isinstance(card_index, int) or not 0 <= card_index < len(hole_cards):
+                return 'Invalid hole card index'
+
+    return None
+
+def _run_ability(socketio, game_id, player_index, ability_type, data):
+    """Dispatch an ability to its handler (runs as a background task)"""
+    handler = _ABILITY_HANDLERS.get(ability_type)
+    if handler is None:
+        send_ability_error_to_player(socketio, game_id, player_index, f'Unknown ability: {ability_type}')
+        return
+
+    try:
+        handler(socketio, game_id, player_index, data)
+    except Exception as e:
+        logger.error("Error processing ability %s: %s", ability_type, e)
+        send_ability_error_to_player(socketio, game_id, player_index, 'Failed to process ability')
+
+def _dispatch_response(socketio, game_id, player_index, response, error_default, choice_sender=None):
+    """Shared response handling for the ability handlers.
+
+    Routes a C# API response to the choice prompt, the result broadcast, or
+    a per-player error - the tail every handler used to duplicate.
+    """
+    if not response:
+        return
+
+    if choice_sender is not None and response.get('ChoiceRequired'):
+        choice_sender(socketio, game_id, player_index, response)
+    elif response.get('Success'):
+        broadcast_ability_result(socketio, game_id, response)
+    else:
+        send_ability_error_to_player(socketio, game_id, player_index,
+                                     response.get('error', error_default))
+
 def handle_peek_ability(socketio, game_id, player_index, data):
     """Handle peek ability - requires target player and card index"""
     target_player_id = data.get('targetPlayerId')
@@ -98,12 +189,7 @@ def handle_peek_ability(socketio, game_id, player_index, data):
     }
     
     response = call_csharp_ability_api(game_id, payload)
-    if response:
-        if response.get('Success'):
-            broadcast_ability_result(socketio, game_id, response)
-        else:
-            # Send error to requesting player only
-            send_ability_error_to_player(socketio, game_id, player_index, response.get('error', 'Peek failed'))
+    _dispatch_response(socketio, game_id, player_index, response, 'Peek failed')
 
 def handle_burn_ability(socketio, game_id, player_index, data):
     """Handle burn ability - requires reveal choice (suit or rank)"""
@@ -121,11 +207,7 @@ def handle_burn_ability(socketio, game_id, player_index, data):
     }
     
     response = call_csharp_ability_api(game_id, payload)
-    if response:
-        if response.get('Success'):
-            broadcast_ability_result(socketio, game_id, response)
-        else:
-            send_ability_error_to_player(socketio, game_id, player_index, response.get('error', 'Burn failed'))
+    _dispatch_response(socketio, game_id, player_index, response, 'Burn failed')
 
 def send_burn_choice_request(socketio, game_id, player_index):
     """Send burn choice request to player"""
@@ -164,37 +246,33 @@ def handle_manifest_ability(socketio, game_id, player_index, data):
             payload['drawnCardSuit'] = drawn_card_suit
     
     response = call_csharp_ability_api(game_id, payload)
-    if response:
-        if response.get('ChoiceRequired'):
-            # API returned choice options - send to player
-            send_manifest_choice_to_player(socketio, game_id, player_index, response)
-        elif response.get('Success'):
-            # Manifest completed
-            broadcast_ability_result(socketio, game_id, response)
-        else:
-            # Error occurred
-            send_ability_error_to_player(socketio, game_id, player_index, response.get('error', 'Manifest failed'))
+    _dispatch_response(socketio, game_id, player_index, response, 'Manifest failed',
+                       choice_sender=send_manifest_choice_to_player)
 
 def send_manifest_choice_to_player(socketio, game_id, player_index, api_response):
     """Send manifest card choice to player using API response"""
     available_cards = api_response.get('AvailableCards', [])
     drawn_card = api_response.get('DrawnCard', {})
     
+    # Tight loop with the get method bound per card - cheaper than a
+    # comprehension re-resolving six attribute lookups per entry
+    cards = []
+    for i, card in enumerate(available_cards):
+        get = card.get
+        cards.append({
+            'index': get('Index', i),
+            'card': get('Card', ''),
+            'rank': get('Rank', ''),
+            'suit': get('Suit', ''),
+            'isDrawnCard': get('IsDrawnCard', False),
+            'cardType': get('CardType', '')
+        })
+
     choice_data = {
         'abilityUsed': 'manifest',
         'choiceRequired': True,
         'step': 1,
-        'availableCards': [
-            {
-                'index': card.get('Index', i),
-                'card': card.get('Card', ''),
-                'rank': card.get('Rank', ''),
-                'suit': card.get('Suit', ''),
-                'isDrawnCard': card.get('IsDrawnCard', False),
-                'cardType': card.get('CardType', '')
-            }
-            for i, card in enumerate(available_cards)
-        ],
+        'availableCards': cards,
         'drawnCard': drawn_card,
         'instructions': api_response.get('Instructions', 'Select one card to discard'),
         'message': 'Manifest: Choose which card to discard'
@@ -219,13 +297,8 @@ def handle_trashman_ability(socketio, game_id, player_index, data):
         payload['holeCardIndex'] = hole_card_index
     
     response = call_csharp_ability_api(game_id, payload)
-    if response:
-        if response.get('ChoiceRequired'):
-            send_trashman_choice_to_player(socketio, game_id, player_index, response)
-        elif response.get('Success'):
-            broadcast_ability_result(socketio, game_id, response)
-        else:
-            send_ability_error_to_player(socketio, game_id, player_index, response.get('error', 'Trashman failed'))
+    _dispatch_response(socketio, game_id, player_index, response, 'Trashman failed',
+                       choice_sender=send_trashman_choice_to_player)
 
 def send_trashman_choice_to_player(socketio, game_id, player_index, api_response):
     """Send trashman choice to player using API response"""
@@ -236,19 +309,21 @@ def send_trashman_choice_to_player(socketio, game_id, player_index, api_response
         available_burnt_cards = api_response.get('AvailableBurntCards', [])
         current_hole_cards = api_response.get('CurrentHoleCards', [])
         
+        burnt_cards = []
+        for i, card in enumerate(available_burnt_cards):
+            get = card.get
+            burnt_cards.append({
+                'index': get('Index', i),
+                'card': get('Card', ''),
+                'rank': get('Rank', ''),
+                'suit': get('Suit', '')
+            })
+
         choice_data = {
             'abilityUsed': 'trashman',
             'choiceRequired': True,
             'step': 1,
-            'availableBurntCards': [
-                {
-                    'index': card.get('Index', i),
-                    'card': card.get('Card', ''),
-                    'rank': card.get('Rank', ''),
-                    'suit': card.get('Suit', '')
-                }
-                for i, card in enumerate(available_burnt_cards)
-            ],
+            'availableBurntCards': burnt_cards,
             'currentHoleCards': current_hole_cards,
             'instructions': api_response.get('Instructions', 'Select which burnt card to retrieve'),
             'message': 'Trashman Step 1: Choose burnt card to retrieve'
@@ -258,20 +333,22 @@ def send_trashman_choice_to_player(socketio, game_id, player_index, api_response
         chosen_burnt_card = api_response.get('ChosenBurntCard', {})
         available_hole_cards = api_response.get('AvailableHoleCards', [])
         
+        hole_cards = []
+        for i, card in enumerate(available_hole_cards):
+            get = card.get
+            hole_cards.append({
+                'index': get('Index', i),
+                'card': get('Card', ''),
+                'rank': get('Rank', ''),
+                'suit': get('Suit', '')
+            })
+
         choice_data = {
             'abilityUsed': 'trashman',
             'choiceRequired': True,
             'step': 2,
             'chosenBurntCard': chosen_burnt_card,
-            'availableHoleCards': [
-                {
-                    'index': card.get('Index', i),
-                    'card': card.get('Card', ''),
-                    'rank': card.get('Rank', ''),
-                    'suit': card.get('Suit', '')
-                }
-                for i, card in enumerate(available_hole_cards)
-            ],
+            'availableHoleCards': hole_cards,
             'instructions': api_response.get('Instructions', 'Select which hole card to discard'),
             'message': f'Trashman Step 2: Choose hole card to discard (retrieving {chosen_burnt_card.get("Card", "card")})'
         }
@@ -286,11 +363,7 @@ def handle_deadman_ability(socketio, game_id, player_index, data):
     }
     
     response = call_csharp_ability_api(game_id, payload)
-    if response:
-        if response.get('Success'):
-            broadcast_ability_result(socketio, game_id, response)
-        else:
-            send_ability_error_to_player(socketio, game_id, player_index, response.get('error', 'Deadman failed'))
+    _dispatch_response(socketio, game_id, player_index, response, 'Deadman failed')
 
 def handle_chaos_ability(socketio, game_id, player_index, data):
     """Handle chaos ability - no choices needed"""
@@ -300,11 +373,7 @@ def handle_chaos_ability(socketio, game_id, player_index, data):
     }
     
     response = call_csharp_ability_api(game_id, payload)
-    if response:
-        if response.get('Success'):
-            broadcast_ability_result(socketio, game_id, response)
-        else:
-            send_ability_error_to_player(socketio, game_id, player_index, response.get('error', 'Chaos failed'))
+    _dispatch_response(socketio, game_id, player_index, response, 'Chaos failed')
 
 def handle_yoink_ability(socketio, game_id, player_index, data):
     """Handle yoink ability - requires hole card and board card choice"""
@@ -324,51 +393,89 @@ def handle_yoink_ability(socketio, game_id, player_index, data):
     }
     
     response = call_csharp_ability_api(game_id, payload)
-    if response:
-        if response.get('ChoiceRequired'):
-            send_yoink_choice_to_player(socketio, game_id, player_index, response)
-        elif response.get('Success'):
-            broadcast_ability_result(socketio, game_id, response)
-        else:
-            send_ability_error_to_player(socketio, game_id, player_index, response.get('error', 'Yoink failed'))
+    _dispatch_response(socketio, game_id, player_index, response, 'Yoink failed',
+                       choice_sender=send_yoink_choice_to_player)
+
+# Short-TTL cache of failed ability responses, keyed by (game_id, payload).
+# A client spamming an invalid action gets the cached rejection instead of
+# another full HTTP round trip. Successful results are never cached.
+_NEGATIVE_CACHE_TTL = 0.25
+_NEGATIVE_CACHE_SWEEP_SIZE = 64  # Sweep expired entries once the dict grows past this
+_negative_cache = {}
 
 def call_csharp_ability_api(game_id, payload):
     """Make API call to C# backend for ability"""
+    cache_key = (game_id, tuple(sorted(payload.items())))
+    cached = _negative_cache.get(cache_key)
+    if cached is not None:
+        expiry, result = cached
+        if time.monotonic() < expiry:
+            return result
+        del _negative_cache[cache_key]
+
     try:
-        logger.info(f"Calling C# API for ability: {payload}")
-        
-        response = requests.post(
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Calling C# API for ability: %s", payload)
+
+        response = _session.post(
             f"{CSHARP_API_URL}/api/game/{game_id}/abilities/use",
             json=payload,
-            headers={'X-API-Key': API_KEY},
-            timeout=API_TIMEOUT
+            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
         )
-        
-        logger.info(f"C# API response: {response.status_code}")
-        
+
+        logger.info("C# API response: %s", response.status_code)
+
         if response.status_code == 200:
             result = response.json()
-            logger.info(f"Ability result: {result}")
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("Ability result: %s", result)
+            if not result.get('Success') and not result.get('ChoiceRequired'):
+                now = time.monotonic()
+                if len(_negative_cache) >= _NEGATIVE_CACHE_SWEEP_SIZE:
+                    # Expired entries for keys never looked up again would
+                    # otherwise accumulate for the process lifetime
+                    expired = [key for key, (expiry, _) in _negative_cache.items()
+                               if expiry <= now]
+                    for key in expired:
+                        del _negative_cache[key]
+                _negative_cache[cache_key] = (now + _NEGATIVE_CACHE_TTL, result)
             return result
         else:
-            logger.error(f"C# API error: {response.status_code} - {response.text}")
+            logger.error("C# API error: %s - %s", response.status_code, response.text)
             return None
             
-    except requests.exceptions.Timeout:
-        logger.error("C# API timeout during ability call")
+    except requests.exceptions.ConnectTimeout:
+        logger.error("C# API connect timeout during ability call")
+        return None
+    except requests.exceptions.ReadTimeout:
+        logger.error("C# API read timeout during ability call")
         return None
     except requests.exceptions.ConnectionError:
         logger.error("Cannot connect to C# API for ability")
         return None
     except Exception as e:
-        logger.error(f"Error calling C# API for ability: {e}")
+        logger.error("Error calling C# API for ability: %s", e)
         return None
 
+def _ability_result_payload(success, message, ability_used, player_name, result=None, summary=None, private=None):
+    """Build a minimal ability_result payload - omit empty results and a
+    summary that just duplicates the message (clients fall back to message)"""
+    payload = {
+        'success': success,
+        'message': message,
+        'abilityUsed': ability_used,
+        'playerName': player_name
+    }
+    if result:
+        payload['result'] = result
+    if summary and summary != message:
+        payload['summary'] = summary
+    if private is not None:
+        payload['isPrivate'] = private
+    return payload
+
 def broadcast_ability_result(socketio, game_id, response):
     """Broadcast ability result to all players in game"""
-    from game import active_games
-    from game_filter import send_filtered_game_state
-    
     if game_id not in active_games:
         return
     
@@ -376,9 +483,17 @@ def broadcast_ability_result(socketio, game_id, response):
     ability_used = response.get('AbilityUsed', '').lower()
     player_name = response.get('PlayerName', '')
     
-    # Update stored game state if provided
+    # Update stored game state if provided, noting whether it actually
+    # changed - abilities like peek return a state identical to the last one
+    state_changed = False
     if 'GameState' in response:
-        game['gameData'] = response['GameState']
+        new_state = response['GameState']
+        digest = hash(orjson.dumps(new_state))
+        if digest != game.get('_gameDataHash'):
+            game['_gameDataHash'] = digest
+            state_changed = True
+        game['gameData'] = new_state
+        _refresh_player_name_cache(game)
     
     # Handle different privacy levels for different abilities
     if ability_used == 'peek':
@@ -416,15 +531,10 @@ def broadcast_ability_result(socketio, game_id, response):
         # CHAOS: Show announcement only (no card details to anyone)
         public_message = f"{player_name} used Chaos ability - all active players' cards have been shuffled!"
         
-        # Send same message to everyone
-        socketio.emit('ability_result', {
-            'success': response.get('Success', False),
-            'message': public_message,
-            'abilityUsed': ability_used,
-            'playerName': player_name,
-            'result': {},  # No private details
-            'summary': public_message
-        }, room=f"game_{game_id}")
+        # Send same message to everyone (no private details)
+        socketio.emit('ability_result', _ability_result_payload(
+            response.get('Success', False), public_message, ability_used, player_name
+        ), room=game['_room'])
         
     elif ability_used == 'yoink':
         # YOINK: Show card swap details to everyone
@@ -435,28 +545,20 @@ def broadcast_ability_result(socketio, game_id, response):
         public_message = f"{player_name} used Yoink - swapped {hole_card} from hand with {board_card} from board"
         
         # Send same message to everyone
-        socketio.emit('ability_result', {
-            'success': response.get('Success', False),
-            'message': public_message,
-            'abilityUsed': ability_used,
-            'playerName': player_name,
-            'result': yoink_result,
-            'summary': public_message
-        }, room=f"game_{game_id}")
+        socketio.emit('ability_result', _ability_result_payload(
+            response.get('Success', False), public_message, ability_used, player_name,
+            result=yoink_result
+        ), room=game['_room'])
         
     else:
         # DEFAULT: Send full message to everyone (fallback)
-        socketio.emit('ability_result', {
-            'success': response.get('Success', False),
-            'message': response.get('Message', ''),
-            'abilityUsed': ability_used,
-            'playerName': player_name,
-            'result': response.get('Result', {}),
-            'summary': response.get('Summary', '')
-        }, room=f"game_{game_id}")
-    
-    # Send filtered game state if updated
-    if 'GameState' in response:
+        socketio.emit('ability_result', _ability_result_payload(
+            response.get('Success', False), response.get('Message', ''), ability_used, player_name,
+            result=response.get('Result', {}), summary=response.get('Summary', '')
+        ), room=game['_room'])
+    
+    # Send filtered game state only if it actually changed
+    if state_changed:
         send_filtered_game_state(
             socketio, 
             'game_state_update', 
@@ -468,8 +570,6 @@ def broadcast_ability_result(socketio, game_id, response):
 
 def send_private_ability_result(socketio, game_id, response, private_message, public_message):
     """Send different messages to the ability user vs other players"""
-    from game import active_games
-    
     if game_id not in active_games:
         return
     
@@ -478,76 +578,65 @@ def send_private_ability_result(socketio, game_id, response, private_message, pu
     ability_used = response.get('AbilityUsed', '').lower()
     player_name = response.get('PlayerName', '')
     
-    # Find the socket ID of the player who used the ability
-    ability_user_socket = None
-    for socket_id, mapping in game.get('playerMapping', {}).items():
-        if mapping['player_index'] + 1 == ability_user_id:  # Convert to 1-based indexing
-            ability_user_socket = socket_id
-            break
-    
+    # Find the socket ID of the player who used the ability (1-based ID map)
+    ability_user_socket = game.get('idToSocket', {}).get(ability_user_id)
+
+    # Build the shared fields once; the two payloads differ only in message,
+    # result and privacy flag. The room broadcast below serializes once for
+    # the whole group (python-socketio encodes a room emit a single time).
+    success = response.get('Success', False)
+
     # Send detailed message to the ability user
     if ability_user_socket:
-        socketio.emit('ability_result', {
-            'success': response.get('Success', False),
-            'message': private_message,
-            'abilityUsed': ability_used,
-            'playerName': player_name,
-            'result': response.get('Result', {}),
-            'summary': private_message,
-            'isPrivate': True
-        }, room=ability_user_socket)
-    
-    # Send public announcement to everyone else
-    for socket_id in game.get('playersJoined', []):
-        if socket_id != ability_user_socket:
-            socketio.emit('ability_result', {
-                'success': response.get('Success', False),
-                'message': public_message,
-                'abilityUsed': ability_used,
-                'playerName': player_name,
-                'result': {},  # No private details for others
-                'summary': public_message,
-                'isPrivate': False
-            }, room=socket_id)
+        socketio.emit('ability_result', _ability_result_payload(
+            success, private_message, ability_used, player_name,
+            result=response.get('Result', {}), private=True
+        ), room=ability_user_socket)
 
-def get_player_name_by_id(game, player_id):
-    """Get player name by their ID from game state"""
+    # Send public announcement to everyone else - one room broadcast with the
+    # ability user excluded, instead of a per-socket emit loop
+    socketio.emit('ability_result', _ability_result_payload(
+        success, public_message, ability_used, player_name, private=False
+    ), room=game['_room'], skip_sid=ability_user_socket)
+
+def _refresh_player_name_cache(game):
+    """Rebuild the id -> name lookup whenever the stored game state changes"""
     game_state = game.get('gameData', {})
     if 'GameState' in game_state:
         actual_game_state = game_state['GameState']
     else:
         actual_game_state = game_state
-    
-    for player in actual_game_state.get('Players', []):
-        if player.get('Id') == player_id:
-            return player.get('Name', f'Player {player_id}')
-    
-    return f'Player {player_id}'
+
+    game['_idToName'] = {
+        player.get('Id'): player.get('Name', f"Player {player.get('Id')}")
+        for player in actual_game_state.get('Players', [])
+    }
+
+def get_player_name_by_id(game, player_id):
+    """Get player name by their ID from game state"""
+    cache = game.get('_idToName')
+    if cache is None:
+        _refresh_player_name_cache(game)
+        cache = game['_idToName']
+
+    return cache.get(player_id, f'Player {player_id}')
 
 def send_ability_choice_to_player(socketio, game_id, player_index, response):
     """Send choice request to specific player"""
-    from game import active_games
-    
     if game_id not in active_games:
         return
     
     game = active_games[game_id]
-    
-    # Find the socket ID for this player
-    target_socket_id = None
-    for socket_id, mapping in game.get('playerMapping', {}).items():
-        if mapping['player_index'] == player_index:
-            target_socket_id = socket_id
-            break
-    
+
+    # Direct reverse lookup (maintained in handle_join_game)
+    target_socket_id = game.get('indexToSocket', {}).get(player_index)
+
     if target_socket_id:
         socketio.emit('ability_choice_required', response, room=target_socket_id)
-        logger.info(f"Sent choice request to player {player_index} in game {game_id}")
+        logger.info("Sent choice request to player %s in game %s", player_index, game_id)
 
 def send_peek_choice_request(socketio, game_id, player_index):
     """Send peek choice request to player"""
-    from game import active_games
-    
     if game_id not in active_games:
         return
         
@@ -584,10 +673,16 @@ def send_peek_choice_request(socketio, game_id, player_index):
     
     send_ability_choice_to_player(socketio, game_id, player_index, choice_data)
 
+def _split_card_list(cards):
+    """Split 'Rank of Suit' strings into choice dicts, tolerating odd formats"""
+    out = []
+    for i, card in enumerate(cards):
+        rank, sep, suit = card.partition(' of ')
+        out.append({'index': i, 'card': card, 'rank': rank, 'suit': suit if sep else ''})
+    return out
+
 def send_yoink_choice_request(socketio, game_id, player_index):
     """Send yoink choice request to player"""
-    from game import active_games
-    
     if game_id not in active_games:
         return
         
@@ -612,18 +707,19 @@ def send_yoink_choice_request(socketio, game_id, player_index):
         send_ability_error_to_player(socketio, game_id, player_index, "No board cards available to yoink")
         return
     
+    # Cache the split card dicts on the game - the card lists only get a new
+    # identity when a fresh GameState is stored, so repeat prompts reuse them
+    cache = game.get('_yoinkSplitCache')
+    if cache is None or cache[0] is not hole_cards or cache[1] is not board_cards:
+        cache = (hole_cards, board_cards, _split_card_list(hole_cards), _split_card_list(board_cards))
+        game['_yoinkSplitCache'] = cache
+
     choice_data = {
         'abilityUsed': 'yoink',
         'choiceRequired': True,
         'step': 1,
-        'availableHoleCards': [
-            {'index': i, 'card': card, 'rank': card.split(' of ')[0], 'suit': card.split(' of ')[1]} 
-            for i, card in enumerate(hole_cards)
-        ],
-        'availableBoardCards': [
-            {'index': i, 'card': card, 'rank': card.split(' of ')[0], 'suit': card.split(' of ')[1]} 
-            for i, card in enumerate(board_cards)
-        ],
+        'availableHoleCards': cache[2],
+        'availableBoardCards': cache[3],
         'instructions': 'Choose one hole card and one board card to swap',
         'message': 'Select cards to swap with Yoink ability',
         'note': 'API uses cardIndex for hole card and targetPlayerId for board card index'
@@ -633,23 +729,28 @@ def send_yoink_choice_request(socketio, game_id, player_index):
 
 def send_ability_error_to_player(socketio, game_id, player_index, error_message):
     """Send error message to specific player"""
-    from game import active_games
-    
     if game_id not in active_games:
         return
     
     game = active_games[game_id]
-    
-    # Find the socket ID for this player
-    target_socket_id = None
-    for socket_id, mapping in game.get('playerMapping', {}).items():
-        if mapping['player_index'] == player_index:
-            target_socket_id = socket_id
-            break
-    
+
+    # Direct reverse lookup (maintained in handle_join_game)
+    target_socket_id = game.get('indexToSocket', {}).get(player_index)
+
     if target_socket_id:
         socketio.emit('ability_error', {'error': error_message}, room=target_socket_id)
-        logger.info(f"Sent ability error to player {player_index}: {error_message}")
+        logger.info("Sent ability error to player %s: %s", player_index, error_message)
+
+# Dispatch table for _run_ability - one hash lookup instead of an if/elif chain
+_ABILITY_HANDLERS = {
+    'peek': handle_peek_ability,
+    'burn': handle_burn_ability,
+    'manifest': handle_manifest_ability,
+    'trashman': handle_trashman_ability,
+    'deadman': handle_deadman_ability,
+    'chaos': handle_chaos_ability,
+    'yoink': handle_yoink_ability
+}
 
 # Export for use in other modules
 __all__ = ['register_ability_events']
\ No newline at end of file
@@ -1,7 +1,14 @@
 # app.py - Main Flask application
+# Monkey-patch before anything else imports socket/ssl so requests and
+# friends cooperate with the eventlet hub instead of blocking a thread
+import eventlet
+eventlet.monkey_patch()
+
 from flask import Flask, render_template
 from flask_socketio import SocketIO
 import logging
+import os
+import orjson_shim
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -11,8 +18,11 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
 
-# Initialize SocketIO
-socketio = SocketIO(app, cors_allowed_origins="*", logger=True, engineio_logger=True)
+# Initialize SocketIO - packet-level logging is opt-in; at INFO it logs
+# every send/recv per socket, which dominates CPU on broadcast fan-outs
+DEBUG_WS = os.environ.get('DEBUG_WS') == '1'
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet',
+                    json=orjson_shim, logger=DEBUG_WS, engineio_logger=DEBUG_WS)
 
 # Import and register lobby routes
 from lobby import register_lobby_events
@@ -42,4 +52,4 @@ def health_check():
 
 if __name__ == '__main__':
     logger.info("Starting Poker Flask App...")
-    socketio.run(app, host='0.0.0.0', port=8001, debug=True)
\ No newline at end of file
+    socketio.run(app, host='0.0.0.0', port=8001, debug=DEBUG_WS)
\ No newline at end of file
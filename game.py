@@ -1,9 +1,14 @@
 # game.py - Poker game management
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import logging
 from flask_socketio import emit, join_room, leave_room
 from flask import request
 import os
+import orjson
+from collections import defaultdict
+from threading import RLock
 from abilities import register_ability_events
 
 
@@ -14,27 +19,63 @@ CSHARP_API_URL = os.environ.get('CSHARP_API_URL', 'http://localhost:5001')
 API_KEY = os.environ.get('POKER_API_KEY', 'poker-game-api-key-2024')
 API_TIMEOUT = 30
 
+# Shared session with keep-alive pooling - game create/start always hit the
+# same C# host, so reuse connections instead of handshaking per call.
+# Pool sized for one worker process (~50 concurrent sockets max).
+_session = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=50,
+    # Retry transient failures (timeouts, resets, 5xx from the proxy) on the
+    # same pooled connection instead of closing and re-handshaking per retry.
+    # Game create/start POSTs are safe to retry - create is allocated server
+    # side per call but a duplicate is just an orphaned game record.
+    max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=(502, 503, 504),
+                      allowed_methods=frozenset(['POST']))
+)
+_session.mount('http://', _adapter)
+_session.mount('https://', _adapter)
+# Bodies are pre-serialized with orjson and passed as data=, so set the
+# content type once here instead of per call
+_session.headers.update({'X-API-Key': API_KEY, 'Content-Type': 'application/json'})
+
 # Global game state - resets on server restart
 active_games = {}
 
+# Lobby module ref, bound once in register_game_events. Importing at module
+# load would be circular (lobby/app load order), and importing inside the
+# handler re-runs the sys.modules lookup on every join.
+_lobby = None
+
+# Per-game locks guarding the join critical section. Under eventlet the
+# handler yields on every emit/log I/O, so two concurrent joins could both
+# pass the all-players-joined check and double-start the game without this.
+_game_locks = defaultdict(RLock)
+
 def create_poker_game(lobby_data):
     """
     Create a new poker game via C# API
     Takes lobby data and returns game_id
     """
     try:
-        # Build payload from lobby data - match C# API exactly
+        # Build payload from lobby data - match C# API exactly.
+        # Convert the config values once rather than per player.
+        config = lobby_data['config']
+        starting_funds = int(config['startingFunds'])
+        small_blind = int(config['smallBlind'])
+        big_blind = int(config['bigBlind'])
+
         payload = {
             "Players": [
                 {
                     "Id": i + 1,  # Note: lowercase 'd' in Id
-                    "Name": player['username'], 
-                    "StartingFunds": int(lobby_data['config']['startingFunds'])
+                    "Name": player['username'],
+                    "StartingFunds": starting_funds
                 }
                 for i, player in enumerate(lobby_data['players'])
             ],
-            "SmallBlind": int(lobby_data['config']['smallBlind']),
-            "BigBlind": int(lobby_data['config']['bigBlind'])
+            "SmallBlind": small_blind,
+            "BigBlind": big_blind
         }
         
         logger.info(f"Creating game with payload: {payload}")
@@ -42,16 +83,16 @@ def create_poker_game(lobby_data):
         logger.info(f"Using API Key: {API_KEY[:10]}...")  # Log first 10 chars for security
         
         # Call C# API
-        response = requests.post(
-            f"{CSHARP_API_URL}/api/game/create", 
-            json=payload,
-            headers={'X-API-Key': API_KEY},
+        # orjson-encode the body ourselves - requests' json= path runs it
+        # through stdlib json.dumps and a bytes->str round-trip
+        response = _session.post(
+            f"{CSHARP_API_URL}/api/game/create",
+            data=orjson.dumps(payload),
             timeout=API_TIMEOUT
         )
         
-        logger.info(f"Response status: {response.status_code}")
-        logger.info(f"Response headers: {dict(response.headers)}")
-        logger.info(f"Response text: {response.text}")
+        logger.info("Response status: %s", response.status_code)
+        logger.debug("Response text: %s", response.text)
         
         if response.status_code == 200:
             game_data = response.json()
@@ -60,11 +101,17 @@ def create_poker_game(lobby_data):
             # Store game data
             active_games[game_id] = {
                 'gameId': game_id,
+                '_room': f"game_{game_id}",  # Cached SocketIO room name
                 'lobbyCode': lobby_data['code'],
-                'players': lobby_data['players'],
+                # Snapshot - the lobby mutates its own list as sockets
+                # disconnect during the lobby->game handoff
+                'players': list(lobby_data['players']),
                 'gameData': game_data,
                 'status': 'created',
-                'playersJoined': []  # Track who has joined game room
+                'playersJoined': set(),  # Sockets in the game room - set for O(1) membership
+                # socket_id -> player_index, seeded from the lobby sockets and
+                # refreshed as players join the game room with new sockets
+                'socketIndex': {p['socketId']: i for i, p in enumerate(lobby_data['players'])}
             }
             
             logger.info(f"Game created successfully: {game_id}")
@@ -83,13 +130,9 @@ def create_poker_game(lobby_data):
                 
             return None
             
-    except requests.exceptions.Timeout:
-        logger.error("C# API timeout during game creation")
-        return None
-    except requests.exceptions.ConnectionError:
-        logger.error("Cannot connect to C# API")
-        return None
     except Exception as e:
+        # Timeouts/connection errors surface here after the adapter's
+        # retries are exhausted
         logger.error(f"Error creating game: {e}")
         return None
 
@@ -101,9 +144,8 @@ def start_poker_game(game_id):
         logger.info(f"Starting game: {game_id}")
         
         # Call C# API to start game
-        response = requests.post(
+        response = _session.post(
             f"{CSHARP_API_URL}/api/game/{game_id}/start",
-            headers={'X-API-Key': API_KEY},
             timeout=API_TIMEOUT
         )
         
@@ -128,6 +170,8 @@ def start_poker_game(game_id):
 
 def register_game_events(socketio):
     """Register game-related WebSocket events"""
+    global _lobby
+    import lobby as _lobby
     
     # Register ability events
     register_ability_events(socketio)
@@ -140,15 +184,14 @@ def register_game_events(socketio):
         game_id = data.get('gameId')
         player_token = data.get('playerToken')
         
-        logger.info(f"Player {socket_id} attempting to join game {game_id} with token")
+        logger.info("Player %s attempting to join game %s with token", socket_id, game_id)
         
-        # Import token storage from lobby
-        from lobby import player_tokens, pending_game_players
+        player_tokens = _lobby.player_tokens
         
-        logger.info(f"=== TOKEN DEBUGGING ===")
-        logger.info(f"Received token: {player_token}")
-        logger.info(f"Available tokens: {list(player_tokens.keys())}")
-        logger.info(f"Pending players for game {game_id}: {pending_game_players.get(game_id, 'NONE')}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Received token: %s", player_token)
+            logger.debug("Available tokens: %s", list(player_tokens.keys()))
+            logger.debug("Pending players for game %s: %s", game_id, _lobby.pending_game_players.get(game_id, 'NONE'))
         
         # Validate token exists and hasn't been used
         if not player_token or player_token not in player_tokens:
@@ -159,12 +202,6 @@ def register_game_events(socketio):
         
         token_info = player_tokens[player_token]
         
-        # Check if token has already been used
-        if token_info.get('used', False):
-            logger.error(f"Token {player_token} has already been used")
-            emit('game_error', {'error': 'Authentication token already used'})
-            return
-        
         # Get player info from token
         username = token_info['username']
         expected_game_id = token_info['game_id']
@@ -192,134 +229,82 @@ def register_game_events(socketio):
             emit('game_error', {'error': 'Invalid player index'})
             return
         
-        # Mark token as used
-        player_tokens[player_token]['used'] = True
-        
-        # Add player to joined list if not already there
-        if socket_id not in game['playersJoined']:
-            game['playersJoined'].append(socket_id)
-            logger.info(f"Added player {socket_id} ({username}) to game {game_id}")
-        
-        # Create/update player mapping
-        if 'playerMapping' not in game:
-            game['playerMapping'] = {}
-        
-        game['playerMapping'][socket_id] = {
-            'username': username,
-            'player_index': player_index,
-            'token': player_token
-        }
-        
-        logger.info(f"Player mapping created: {username} -> socket {socket_id} -> index {player_index}")
-        
-        # Join game room
-        join_room(f"game_{game_id}")
-        
+        # Bookkeeping and the all-joined check run under the per-game lock
+        # so interleaved joins can't both trigger the game start
+        with _game_locks[game_id]:
+            # Consume the token - pop is atomic, so a replayed or raced token
+            # fails here instead of needing a separate check-then-mark step
+            if player_tokens.pop(player_token, None) is None:
+                logger.error(f"Token {player_token} has already been used")
+                emit('game_error', {'error': 'Authentication token already used'})
+                return
+
+            # Add player to joined set if not already there
+            if socket_id not in game['playersJoined']:
+                game['playersJoined'].add(socket_id)
+                logger.info(f"Added player {socket_id} ({username}) to game {game_id}")
+
+            # Create/update player mapping
+            if 'playerMapping' not in game:
+                game['playerMapping'] = {}
+
+            game['playerMapping'][socket_id] = {
+                'username': username,
+                'player_index': player_index,
+                'token': player_token
+            }
+
+            # Reverse lookups so per-player emits don't need to scan playerMapping
+            game.setdefault('indexToSocket', {})[player_index] = socket_id
+            game.setdefault('idToSocket', {})[player_index + 1] = socket_id  # C# API uses 1-based IDs
+            game.setdefault('socketIndex', {})[socket_id] = player_index
+
+            logger.info(f"Player mapping created: {username} -> socket {socket_id} -> index {player_index}")
+
+            # Join game room
+            join_room(game['_room'])
+
+            # Count once - emits and logs below all reuse these
+            joined_count = len(game['playersJoined'])
+            total_players = len(game['players'])
+            all_joined = joined_count == total_players and game['status'] == 'created'
+            if all_joined:
+                game['status'] = 'starting'
+
         # Send game room joined confirmation
         emit('game_room_joined', {
             'gameId': game_id,
-            'playersJoined': len(game['playersJoined']),
-            'totalPlayers': len(game['players']),
+            'playersJoined': joined_count,
+            'totalPlayers': total_players,
             'message': 'Joined game room'
         })
         
-        logger.info(f"Player {username} ({socket_id}) joined game room {game_id} ({len(game['playersJoined'])}/{len(game['players'])})")
+        logger.info(f"Player {username} ({socket_id}) joined game room {game_id} ({joined_count}/{total_players})")
         
         # Check if all players have joined
-        if len(game['playersJoined']) == len(game['players']):
-            # All players joined, now start the actual game
+        if all_joined:
+            # All players joined - start the actual game on a background task
+            # so the blocking C# start call doesn't stall this worker's
+            # other websocket traffic
             logger.info(f"All players joined game {game_id}, starting game...")
-            
-            # Start the game via C# API
-            game_state = start_poker_game(game_id)
-            
-            if game_state:
-                # Extract the actual game state from the nested response
-                if 'GameState' in game_state:
-                    actual_game_state = game_state['GameState']
-                else:
-                    actual_game_state = game_state
-                
-                game['gameData'] = actual_game_state
-                game['status'] = 'started'
-                
-                logger.info(f"=== DEBUGGING GAME START FOR {game_id} ===")
-                logger.info(f"Players in game metadata: {len(game['players'])}")
-                logger.info(f"Players joined: {len(game['playersJoined'])}")
-                logger.info(f"Players in C# game state: {len(actual_game_state.get('Players', []))}")
-                
-                # Log all player mappings
-                for i, player_info in enumerate(game['players']):
-                    logger.info(f"Player {i}: lobby_socket={player_info['socketId']}, username={player_info['username']}")
-                
-                # Log who actually joined the game room
-                for i, joined_socket in enumerate(game['playersJoined']):
-                    logger.info(f"Joined {i}: socket={joined_socket}")
-                
-                # Log C# game state players
-                for i, cs_player in enumerate(actual_game_state.get('Players', [])):
-                    logger.info(f"C# Player {i}: name={cs_player.get('Name')}, id={cs_player.get('Id')}")
-                
-                # FIX: Use the player mapping to send correct filtered states
-                for socket_id in game['playersJoined']:
-                    player_mapping = game['playerMapping'][socket_id]
-                    player_index = player_mapping['player_index']
-                    username = player_mapping['username']
-                    
-                    logger.info(f"Processing player: {username} (socket: {socket_id}, index: {player_index})")
-                    
-                    # Create filtered copy for this specific player
-                    import copy
-                    filtered_state = copy.deepcopy(actual_game_state)
-                    
-                    # Hide other players' private information
-                    for j, player in enumerate(filtered_state['Players']):
-                        if j != player_index:  # Not this player's index
-                            logger.info(f"Hiding player {j} data from {username} (player {player_index})")
-                            player['HoleCards'] = []
-                            player['Abilities'] = []
-                            player['AbilityCount'] = 0
-                            player['ValidActions'] = []
-                            player['ActionContext'] = None
-                        else:
-                            logger.info(f"Keeping player {j} data for {username}: {len(player.get('HoleCards', []))} cards, {len(player.get('Abilities', []))} abilities")
-                    
-                    # Send filtered state to this specific player
-                    try:
-                        socketio.emit('game_started', {
-                            'gameId': game_id,
-                            'gameState': filtered_state,
-                            'message': 'All players joined! Game started!'
-                        }, to=socket_id)
-                        
-                        logger.info(f"✅ Successfully sent filtered game_started to {username} ({socket_id})")
-                    except Exception as e:
-                        logger.error(f"❌ Failed to send game_started to {username}: {e}")
-                
-                logger.info(f"=== GAME START COMPLETE FOR {game_id} ===")
-                logger.info(f"Game {game_id} started successfully - sent to all players")
-            else:
-                logger.error(f"Failed to start game {game_id}")
-                socketio.emit('game_error', {
-                    'error': 'Failed to start game'
-                }, room=f"game_{game_id}")
+            socketio.start_background_task(_finalize_game_start, socketio, game_id)
         else:
             # Still waiting for more players
             socketio.emit('waiting_for_players', {
-                'playersJoined': len(game['playersJoined']),
-                'totalPlayers': len(game['players']),
-                'message': f'Waiting for players... ({len(game["playersJoined"])}/{len(game["players"])})'
-            }, room=f"game_{game_id}")
-    
+                'playersJoined': joined_count,
+                'totalPlayers': total_players,
+                'message': f'Waiting for players... ({joined_count}/{total_players})'
+            }, room=game['_room'])
+
     @socketio.on('get_game_state')
     def handle_get_game_state(data):
         """Get current game state"""
         game_id = data.get('gameId')
-        
+
         if not game_id or game_id not in active_games:
             emit('game_error', {'error': 'Game not found'})
             return
-        
+
         # For now, return stored game state
         # Later we'll fetch fresh state from C# API
         game_data = active_games[game_id]['gameData']
@@ -328,5 +313,82 @@ def register_game_events(socketio):
             'gameState': game_data
         })
 
+def _finalize_game_start(socketio, game_id):
+    """Start the game via the C# API and fan out per-player filtered states
+
+    Runs as a background task spawned from handle_join_game once the last
+    player has joined.
+    """
+    game = active_games.get(game_id)
+    if game is None:
+        logger.error(f"Game {game_id} disappeared before start")
+        return
+
+    # Start the game via C# API
+    game_state = start_poker_game(game_id)
+
+    if not game_state:
+        logger.error(f"Failed to start game {game_id}")
+        socketio.emit('game_error', {
+            'error': 'Failed to start game'
+        }, room=game['_room'])
+        return
+
+    # Extract the actual game state from the nested response
+    if 'GameState' in game_state:
+        actual_game_state = game_state['GameState']
+    else:
+        actual_game_state = game_state
+
+    game['gameData'] = actual_game_state
+    game['status'] = 'started'
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("=== DEBUGGING GAME START FOR %s ===", game_id)
+        logger.debug("Players in game metadata: %d", len(game['players']))
+        logger.debug("Players joined: %d", len(game['playersJoined']))
+        logger.debug("Players in C# game state: %d", len(actual_game_state.get('Players', [])))
+        for i, player_info in enumerate(game['players']):
+            logger.debug("Player %d: lobby_socket=%s, username=%s", i, player_info['socketId'], player_info['username'])
+        for i, joined_socket in enumerate(game['playersJoined']):
+            logger.debug("Joined %d: socket=%s", i, joined_socket)
+        for i, cs_player in enumerate(actual_game_state.get('Players', [])):
+            logger.debug("C# Player %d: name=%s, id=%s", i, cs_player.get('Name'), cs_player.get('Id'))
+
+    # Build the shared pieces once - the public view of each player and the
+    # base state dict. Per recipient, only the Players list differs, and the
+    # orjson encoder wired at app init handles the actual serialization.
+    players = actual_game_state['Players']
+    public_players = [
+        {**player, 'HoleCards': [], 'Abilities': [], 'AbilityCount': 0,
+         'ValidActions': [], 'ActionContext': None}
+        for player in players
+    ]
+    # One room-wide broadcast carries the shared public state, then each
+    # player gets a tiny private message with just their own entry. That
+    # serializes and sends the big state once instead of once per player.
+    public_state = {**actual_game_state, 'Players': public_players}
+    socketio.emit('game_started_public', {
+        'gameId': game_id,
+        'gameState': public_state,
+        'message': 'All players joined! Game started!'
+    }, room=game['_room'])
+
+    for socket_id in game['playersJoined']:
+        player_mapping = game['playerMapping'][socket_id]
+        player_index = player_mapping['player_index']
+        username = player_mapping['username']
+        try:
+            socketio.emit('game_started_private', {
+                'gameId': game_id,
+                'playerIndex': player_index,
+                'you': players[player_index]
+            }, to=socket_id)
+            logger.debug("Sent game_started_private to %s (%s)", username, socket_id)
+        except Exception as e:
+            logger.error(f"❌ Failed to send game_started_private to {username}: {e}")
+
+    logger.info("Game %s started successfully - sent to all players", game_id)
+
 # Export for use in other modules
 __all__ = ['create_poker_game', 'start_poker_game', 'register_game_events', 'active_games']
\ No newline at end of file
@@ -1,5 +1,4 @@
 # game_filter.py - Filter game state for individual players
-import copy
 import logging
 
 logger = logging.getLogger(__name__)
@@ -17,42 +16,56 @@ def filter_game_state_for_player(game_state, player_socket_id, game_metadata):
         Filtered game state with only the player's private information
     """
     try:
-        # Create a deep copy to avoid modifying the original
-        filtered_state = copy.deepcopy(game_state)
-        
-        # Find which player this socket represents
-        player_index = None
-        for i, player_info in enumerate(game_metadata['players']):
-            if player_info['socketId'] == player_socket_id:
-                player_index = i
-                break
-        
+        # Find which player this socket represents (O(1) via socketIndex)
+        player_index = get_player_index_by_socket(player_socket_id, game_metadata)
+
         if player_index is None:
             logger.warning(f"Could not find player for socket {player_socket_id}")
-            return filtered_state
-        
-        # Filter players - hide other players' private info
-        for i, player in enumerate(filtered_state['Players']):
-            if i != player_index:
-                # Hide other players' private information
-                player['HoleCards'] = []  # Empty for other players
-                player['Abilities'] = []  # Empty for other players
-                player['AbilityCount'] = 0
-                player['ValidActions'] = []  # Only current player needs actions
-                player['ActionContext'] = None
-                # Keep public info like balance, bets, turn status, etc.
-        
-        logger.info(f"Filtered game state for player {player_socket_id} (index {player_index})")
+            return game_state
+
+        # Single-player state has nothing to hide from its only viewer
+        if len(game_state['Players']) <= 1:
+            return game_state
+
+        # Build a shallow filtered view - other players get a copy with
+        # private fields blanked, this player's entry is kept by reference,
+        # and public info like balance, bets, turn status passes through
+        filtered_players = [
+            player if i == player_index else {
+                **player, 'HoleCards': [], 'Abilities': [], 'AbilityCount': 0,
+                'ValidActions': [], 'ActionContext': None
+            }
+            for i, player in enumerate(game_state['Players'])
+        ]
+        filtered_state = {**game_state, 'Players': filtered_players}
+
         return filtered_state
         
     except Exception as e:
         logger.error(f"Error filtering game state: {e}")
         return game_state  # Return original on error
 
+def _batched_emit(socketio, targets, event_name, payload_fn, batch=50):
+    """
+    Emit a per-target payload in batches, yielding to the event loop between
+    batches so large fan-outs don't stall other sockets
+
+    Args:
+        socketio: SocketIO instance
+        targets: List of socket IDs to send to
+        event_name: Name of the event to emit
+        payload_fn: Callable mapping a socket ID to its payload
+        batch: Number of emits between cooperative yields
+    """
+    for i in range(0, len(targets), batch):
+        for socket_id in targets[i:i + batch]:
+            socketio.emit(event_name, payload_fn(socket_id), room=socket_id)
+        socketio.sleep(0)
+
 def send_filtered_game_state(socketio, event_name, game_id, game_state, game_metadata, message=None):
     """
     Send filtered game state to each player individually
-    
+
     Args:
         socketio: SocketIO instance
         event_name: Name of the event to emit (e.g., 'game_started', 'game_state_update')
@@ -62,27 +75,41 @@ def send_filtered_game_state(socketio, event_name, game_id, game_state, game_met
         message: Optional message to include
     """
     try:
-        # Send personalized game state to each player
-        for i, player_info in enumerate(game_metadata['players']):
-            player_socket_id = player_info['socketId']
-            
-            # Filter game state for this specific player
-            filtered_state = filter_game_state_for_player(game_state, player_socket_id, game_metadata)
-            
-            # Build event payload
+        # Build the shared pieces once: the public view of every player and
+        # the base state dict. Per recipient only the Players list differs -
+        # their own entry stays by reference, everyone else gets the
+        # prebuilt public copy. Fresh lists/dicts per emit so a queued
+        # payload can't be overwritten by the next iteration.
+        players = game_state['Players']
+        public_players = [
+            {**player, 'HoleCards': [], 'Abilities': [], 'AbilityCount': 0,
+             'ValidActions': [], 'ActionContext': None}
+            for player in players
+        ]
+
+        def build_payload(player_socket_id):
+            player_index = get_player_index_by_socket(player_socket_id, game_metadata)
+            if player_index is None:
+                logger.warning(f"Could not find player for socket {player_socket_id}")
+                filtered_state = game_state
+            else:
+                filtered_state = {**game_state, 'Players': (
+                    public_players[:player_index]
+                    + [players[player_index]]
+                    + public_players[player_index + 1:]
+                )}
             payload = {
                 'gameId': game_id,
                 'gameState': filtered_state
             }
-            
             if message:
                 payload['message'] = message
-            
-            # Send to specific player only
-            socketio.emit(event_name, payload, room=player_socket_id)
-            
-            logger.info(f"Sent {event_name} to player {player_socket_id} (index {i})")
-        
+            return payload
+
+        # Send personalized game state to each player, yielding between batches
+        targets = [player_info['socketId'] for player_info in game_metadata['players']]
+        _batched_emit(socketio, targets, event_name, build_payload)
+
         logger.info(f"Sent filtered {event_name} to all {len(game_metadata['players'])} players")
         
     except Exception as e:
@@ -92,13 +119,18 @@ def send_filtered_game_state(socketio, event_name, game_id, game_state, game_met
             'gameId': game_id,
             'gameState': game_state,
             'message': message or 'Game state update'
-        }, room=f"game_{game_id}")
+        }, room=game_metadata.get('_room', f"game_{game_id}"))
 
 # Helper function to identify player by socket ID
 def get_player_index_by_socket(socket_id, game_metadata):
     """
     Get the player index (0, 1, 2, etc.) for a given socket ID
     """
+    socket_index = game_metadata.get('socketIndex')
+    if socket_index is not None:
+        return socket_index.get(socket_id)
+
+    # Fallback for metadata without the precomputed map (e.g. lobby dicts)
     for i, player_info in enumerate(game_metadata['players']):
         if player_info['socketId'] == socket_id:
             return i
@@ -115,7 +147,7 @@ def can_player_see_cards(viewing_player_index, target_player_index):
 # Export functions
 __all__ = [
     'filter_game_state_for_player',
-    'send_filtered_game_state', 
+    'send_filtered_game_state',
     'get_player_index_by_socket',
     'can_player_see_cards'
 ]
\ No newline at end of file
@@ -1,31 +1,150 @@
 # lobby.py - Simple lobby management
 from flask_socketio import emit, join_room, leave_room
 from flask import request
-import random
 import logging
 import secrets
+import time
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
-# Global state - resets on server restart
-active_lobbies = {}
+# Global state - resets on server restart. All of this is plain dicts on
+# purpose: the app runs one eventlet worker, greenlets only switch at I/O,
+# and none of the handlers yield mid-mutation, so dict ops here are already
+# atomic without locks or sharding. Scaling past one process means moving
+# this state out (Redis + message_queue), not partitioning it in-process.
+class Player:
+    """Lobby player record.
+
+    __slots__ keeps the per-player footprint small and attribute access
+    index-based instead of hashed; the mapping helpers keep dict-style
+    call sites (game.py reads players with ['...']) working unchanged.
+    """
+    __slots__ = ('socketId', 'username', 'isHost', 'isReady', 'token', '_last_ready_ts')
+
+    def __init__(self, socket_id, username, is_host, token):
+        self.socketId = socket_id
+        self.username = username
+        self.isHost = is_host
+        self.isReady = False
+        self.token = token
+        self._last_ready_ts = 0.0
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def to_dict(self):
+        """Client-safe JSON view - no token, no internal fields"""
+        return {
+            'socketId': self.socketId,
+            'username': self.username,
+            'isHost': self.isHost,
+            'isReady': self.isReady
+        }
+
+class LobbyStore:
+    """In-memory lobby storage behind a small mapping interface.
+
+    Handlers (and the /health route) talk to this like a dict, so a
+    Redis-backed implementation can replace it later without touching
+    them - the methods map straight onto hash ops.
+    """
+    def __init__(self):
+        self._lobbies = {}
+
+    def __len__(self):
+        return len(self._lobbies)
+
+    def __contains__(self, code):
+        return code in self._lobbies
+
+    def __getitem__(self, code):
+        return self._lobbies[code]
+
+    def __setitem__(self, code, lobby):
+        self._lobbies[code] = lobby
+
+    def __delitem__(self, code):
+        del self._lobbies[code]
+
+    def get(self, code, default=None):
+        return self._lobbies.get(code, default)
+
+    def remove_player(self, code, socket_id):
+        """Drop a player from a lobby; returns the removed record or None"""
+        lobby = self._lobbies.get(code)
+        if lobby is None:
+            return None
+        player = lobby['players_by_sid'].pop(socket_id, None)
+        if player is not None:
+            lobby['players'].remove(player)
+            if player.isReady:
+                lobby['ready_count'] -= 1
+            lobby.pop('_public', None)
+        return player
+
+active_lobbies = LobbyStore()
 player_sessions = {}
-used_codes = set()
 player_tokens = {}  # Global token storage: token -> player_info
-pending_game_players = {}  # gameId -> [list of players waiting to join]
+pending_game_players = {}  # gameId -> {username: player_index} awaiting join
+
+# Tokens from abandoned lobbies and crashed clients would otherwise live for
+# the process lifetime - sweep out anything unused for an hour
+TOKEN_TTL_SECONDS = 3600
+_TOKEN_SWEEP_INTERVAL = 60
+
+def _sweep_expired_tokens(socketio):
+    """Background task: periodically evict tokens past their TTL"""
+    while True:
+        socketio.sleep(_TOKEN_SWEEP_INTERVAL)
+        cutoff = time.monotonic() - TOKEN_TTL_SECONDS
+        expired = [token for token, info in player_tokens.items()
+                   if info['created'] < cutoff]
+        for token in expired:
+            del player_tokens[token]
+        if expired:
+            logger.info("Swept %d expired player tokens", len(expired))
+
+_CODE_ALPHABET = b'ABCDEFGHJKLMNPQRSTUVWXYZ'  # No I, O - 24 letters
+
+# Default lobby config; create reads these keys from the request data and
+# config updates accept the same whitelist (minus maxPlayers)
+_CONFIG_DEFAULTS = {'smallBlind': 5, 'bigBlind': 10, 'startingFunds': 1000, 'maxPlayers': 8}
 
 def generate_lobby_code():
     """Generate unique 6-letter code"""
-    letters = 'ABCDEFGHJKLMNPQRSTUVWXYZ'  # No I, O
+    # One CSPRNG draw mapped byte-per-letter through the bytes alphabet -
+    # a single allocation per code instead of the divmod/join dance. The
+    # mod-24 fold skews letter frequency slightly, which is fine: codes
+    # only need to be unique and hard to guess, not uniform.
     while True:
-        code = ''.join(random.choice(letters) for _ in range(6))
-        if code not in used_codes and code not in active_lobbies:
-            used_codes.add(code)
+        raw = secrets.token_bytes(6)
+        code = bytes(_CODE_ALPHABET[b % 24] for b in raw).decode('ascii')
+        if code not in active_lobbies:
             return code
 
+def public_view(lobby):
+    """Client-safe view of a lobby - players without their tokens, and no
+    internal indexes. Memoized on the lobby and invalidated on mutation so
+    repeated initial-sync emits don't rebuild it."""
+    view = lobby.get('_public')
+    if view is None:
+        view = {
+            'code': lobby['code'],
+            'name': lobby['name'],
+            'players': [player.to_dict() for player in lobby['players']],
+            'config': lobby['config'],
+            'status': lobby['status']
+        }
+        lobby['_public'] = view
+    return view
+
 def register_lobby_events(socketio):
     """Register all lobby WebSocket events"""
+    socketio.start_background_task(_sweep_expired_tokens, socketio)
     
     @socketio.on('connect')
     def handle_connect():
@@ -46,16 +165,23 @@ def register_lobby_events(socketio):
         if socket_id in player_sessions:
             lobby_code = player_sessions[socket_id].get('lobby_code')
             if lobby_code and lobby_code in active_lobbies:
-                # Remove player from lobby
+                # Remove player from lobby via the socket index, and
+                # retire their pre-game token right away
                 lobby = active_lobbies[lobby_code]
-                lobby['players'] = [p for p in lobby['players'] if p['socketId'] != socket_id]
+                player = active_lobbies.remove_player(lobby_code, socket_id)
+                if player is not None:
+                    # Only retire tokens that never got bound to a game -
+                    # during the lobby->game handoff the old socket
+                    # disconnects while the new socket still needs the token
+                    token_info = player_tokens.get(player.token)
+                    if token_info is not None and token_info['game_id'] is None:
+                        del player_tokens[player.token]
                 
-                # Notify others
-                socketio.emit('player_left', {'lobby': lobby}, room=f"lobby_{lobby_code}")
+                # Notify others - just the leaver's id, clients reconcile
+                socketio.emit('player_left', {'socketId': socket_id}, room=lobby['room'])
                 
                 # Clean up empty lobby
                 if len(lobby['players']) == 0:
-                    used_codes.discard(lobby_code)
                     del active_lobbies[lobby_code]
             
             del player_sessions[socket_id]
@@ -89,36 +215,32 @@ def register_lobby_events(socketio):
             'username': username,
             'game_id': None,  # Will be set when game starts
             'player_index': None,  # Will be set when game starts
-            'used': False  # Track if token has been used
+            'created': time.monotonic()  # For TTL-based eviction
         }
         
         # Generate lobby
         lobby_code = generate_lobby_code()
+        lobby_room = f"lobby_{lobby_code}"
+        host_player = Player(socket_id, username, True, player_token)
         lobby = {
             'code': lobby_code,
+            'room': lobby_room,  # Cached SocketIO room name
             'name': data.get('name', 'New Lobby'),
             'host': socket_id,
-            'players': [{
-                'socketId': socket_id,
-                'username': username,
-                'isHost': True,
-                'isReady': False,
-                'token': player_token  # Store token with player
-            }],
-            'config': {
-                'smallBlind': data.get('smallBlind', 5),
-                'bigBlind': data.get('bigBlind', 10),
-                'startingFunds': data.get('startingFunds', 1000),
-                'maxPlayers': data.get('maxPlayers', 8)
-            },
-            'status': 'waiting'
+            'host_player': host_player,  # Direct ref - host ops skip the list
+
+            'players': [host_player],
+            'players_by_sid': {socket_id: host_player},  # O(1) lookup by socket
+            'config': {k: data.get(k, default) for k, default in _CONFIG_DEFAULTS.items()},
+            'status': 'waiting',
+            'ready_count': 0  # Maintained on toggle/leave for an O(1) all-ready check
         }
         
         active_lobbies[lobby_code] = lobby
         player_sessions[socket_id]['lobby_code'] = lobby_code
         
-        join_room(f"lobby_{lobby_code}")
-        emit('lobby_created', {'lobbyCode': lobby_code, 'lobby': lobby})
+        join_room(lobby_room)
+        emit('lobby_created', {'lobbyCode': lobby_code, 'lobby': public_view(lobby)})
         
         logger.info(f"Created lobby {lobby_code} with token for {username}")
     
@@ -150,24 +272,25 @@ def register_lobby_events(socketio):
             'username': username,
             'game_id': None,  # Will be set when game starts
             'player_index': None,  # Will be set when game starts
-            'used': False  # Track if token has been used
+            'created': time.monotonic()  # For TTL-based eviction
         }
         
         # Add player
-        new_player = {
-            'socketId': socket_id,
-            'username': username,
-            'isHost': False,
-            'isReady': False,
-            'token': player_token  # Store token with player
-        }
+        new_player = Player(socket_id, username, False, player_token)
         
         lobby['players'].append(new_player)
+        lobby['players_by_sid'][socket_id] = new_player
+        lobby.pop('_public', None)
         player_sessions[socket_id]['lobby_code'] = lobby_code
         
-        join_room(f"lobby_{lobby_code}")
-        emit('lobby_joined', {'lobbyCode': lobby_code, 'lobby': lobby})
-        socketio.emit('player_joined', {'player': new_player, 'lobby': lobby}, room=f"lobby_{lobby_code}")
+        join_room(lobby['room'])
+        emit('lobby_joined', {'lobbyCode': lobby_code, 'lobby': public_view(lobby)})
+        # Broadcast the new player without their token - only its owner may
+        # ever see a token, via their own transition_to_game
+        public_player = new_player.to_dict()
+        # The joiner already got the full lobby via lobby_joined - no echo
+        socketio.emit('player_joined', {'player': public_player}, room=lobby['room'],
+                      skip_sid=socket_id)
         
         logger.info(f"Player {username} joined lobby {lobby_code} with token")
     
@@ -181,17 +304,21 @@ def register_lobby_events(socketio):
             return
         
         lobby = active_lobbies[lobby_code]
-        lobby['players'] = [p for p in lobby['players'] if p['socketId'] != socket_id]
+        player = active_lobbies.remove_player(lobby_code, socket_id)
+        if player is not None:
+            token_info = player_tokens.get(player.token)
+            if token_info is not None and token_info['game_id'] is None:
+                del player_tokens[player.token]
         
-        leave_room(f"lobby_{lobby_code}")
+        leave_room(lobby['room'])
         player_sessions[socket_id]['lobby_code'] = None
         
         emit('lobby_left', {'message': 'Left lobby'})
-        socketio.emit('player_left', {'lobby': lobby}, room=f"lobby_{lobby_code}")
+        socketio.emit('player_left', {'socketId': socket_id}, room=lobby['room'],
+                      skip_sid=socket_id)
         
         # Clean up empty lobby
         if len(lobby['players']) == 0:
-            used_codes.discard(lobby_code)
             del active_lobbies[lobby_code]
     
     @socketio.on('toggle_ready')
@@ -204,12 +331,22 @@ def register_lobby_events(socketio):
         
         lobby = active_lobbies[lobby_code]
         
-        # Find player and toggle ready
-        for player in lobby['players']:
-            if player['socketId'] == socket_id:
-                player['isReady'] = not player['isReady']
-                socketio.emit('player_ready_changed', {'lobby': lobby}, room=f"lobby_{lobby_code}")
-                break
+        # O(1) lookup instead of scanning the players list
+        player = lobby['players_by_sid'].get(socket_id)
+        if player is not None:
+            # Debounce double-clicked ready buttons - a bounced toggle
+            # would otherwise fan out two broadcasts within a few ms
+            now = time.monotonic()
+            if now - player._last_ready_ts < 0.05:
+                return
+            player._last_ready_ts = now
+            player.isReady = not player.isReady
+            lobby['ready_count'] += 1 if player.isReady else -1
+            lobby.pop('_public', None)
+            socketio.emit('player_ready_changed', {
+                'socketId': socket_id,
+                'isReady': player.isReady
+            }, room=lobby['room'])
     
     @socketio.on('update_lobby_config')
     def handle_update_lobby_config(data):
@@ -226,21 +363,28 @@ def register_lobby_events(socketio):
             emit('lobby_error', {'error': 'Only host can update settings'})
             return
         
-        # Update config
+        # Update config and broadcast only the keys that changed
         config = lobby['config']
-        if 'smallBlind' in data:
-            config['smallBlind'] = data['smallBlind']
-        if 'bigBlind' in data:
-            config['bigBlind'] = data['bigBlind']
-        if 'startingFunds' in data:
-            config['startingFunds'] = data['startingFunds']
-        
-        socketio.emit('lobby_config_updated', {'lobby': lobby}, room=f"lobby_{lobby_code}")
+        changed = {}
+        for key in ('smallBlind', 'bigBlind', 'startingFunds'):  # maxPlayers is create-time only
+            if key in data:
+                config[key] = data[key]
+                changed[key] = data[key]
+        if changed:
+            lobby.pop('_public', None)
+        
+        # The host applies the change locally when submitting the form
+        socketio.emit('lobby_config_updated', {'config': changed}, room=lobby['room'],
+                      skip_sid=socket_id)
     
     @socketio.on('start_game')
     def handle_start_game():
         socket_id = request.sid
-        logger.info(f"=== START GAME EVENT RECEIVED from {socket_id} ===")
+        # Bind the hottest globals to locals - this handler touches the
+        # token dict many times per player and LOAD_FAST beats LOAD_GLOBAL
+        tokens = player_tokens
+        sio_emit = socketio.emit
+        logger.info("Start game event received from %s", socket_id)
         
         lobby_code = player_sessions[socket_id].get('lobby_code')
         
@@ -250,7 +394,7 @@ def register_lobby_events(socketio):
             return
         
         lobby = active_lobbies[lobby_code]
-        logger.info(f"Processing start_game for lobby {lobby_code}")
+        logger.info("Processing start_game for lobby %s", lobby_code)
         
         # Only host can start game
         if lobby['host'] != socket_id:
@@ -258,8 +402,9 @@ def register_lobby_events(socketio):
             emit('game_error', {'error': 'Only host can start game'})
             return
         
-        # Check if all players are ready
-        if not all(player['isReady'] for player in lobby['players']):
+        # Check if all players are ready - counter kept current by
+        # toggle/leave, so no scan
+        if lobby['ready_count'] != len(lobby['players']):
             logger.error(f"Not all players ready in lobby {lobby_code}")
             emit('game_error', {'error': 'All players must be ready'})
             return
@@ -270,7 +415,7 @@ def register_lobby_events(socketio):
             emit('game_error', {'error': 'Need at least 2 players'})
             return
         
-        logger.info(f"All checks passed, creating game for lobby {lobby_code}")
+        logger.info("All checks passed, creating game for lobby %s", lobby_code)
         
         # Create game via C# API
         from game import create_poker_game
@@ -282,59 +427,69 @@ def register_lobby_events(socketio):
             emit('game_error', {'error': 'Failed to create game'})
             return
         
-        logger.info(f"Game {game_id} created successfully, now updating tokens...")
+        logger.info("Game %s created successfully, now updating tokens...", game_id)
         
-        # IMMEDIATELY update tokens and prepare players (before any transitions)
-        logger.info(f"=== UPDATING TOKENS FOR GAME {game_id} ===")
-        logger.info(f"Lobby players: {[p['username'] for p in lobby['players']]}")
-        logger.info(f"Player tokens before update: {player_tokens}")
+        # IMMEDIATELY update tokens and prepare players (before any transitions).
+        # The full token/pending dumps are unbounded structures - keep them (and
+        # the per-player progress lines) at DEBUG so game start doesn't pay for
+        # their reprs at INFO.
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug("Lobby players: %r", [p['username'] for p in lobby['players']])
+            logger.debug("Player tokens before update: %r", tokens)
         
-        game_players = []
+        # Update lobby status  
+        lobby['status'] = 'transitioning'
+        lobby['gameId'] = game_id
+        lobby.pop('_public', None)
+        
+        # One pass over the players: update tokens, build the pending list,
+        # move rooms, and send each player their transition event
+        lobby_room = lobby['room']
+        game_room = f"game_{game_id}"
+        get_token_info = tokens.get
+        pending_players = {}
         for i, player in enumerate(lobby['players']):
-            logger.info(f"Processing player {i}: {player['username']} with token {player['token']}")
+            token = player.token
+            username = player.username
             
             # Update token with game info
-            if player['token'] in player_tokens:
-                player_tokens[player['token']]['game_id'] = game_id
-                player_tokens[player['token']]['player_index'] = i
-                logger.info(f"✅ Updated token {player['token']} for {player['username']} with game_id={game_id}, player_index={i}")
-                logger.info(f"Token after update: {player_tokens[player['token']]}")
+            token_info = get_token_info(token)
+            if token_info is not None:
+                token_info['game_id'] = game_id
+                token_info['player_index'] = i
+                if debug:
+                    logger.debug("Updated token for %s: game_id=%s, player_index=%d",
+                                 username, game_id, i)
             else:
-                logger.error(f"❌ Token {player['token']} not found in player_tokens!")
-                logger.error(f"Available tokens: {list(player_tokens.keys())}")
+                logger.error("❌ Token for %s not found in player_tokens!", username)
             
-            game_players.append({
-                'username': player['username'],
-                'token': player['token'],
-                'player_index': i
-            })
+            # Tokens live in player_tokens only - the pending map just
+            # records who is expected and at which seat
+            pending_players[username] = i
+            
+            sid = player.socketId
+            leave_room(lobby_room, sid=sid)
+            join_room(game_room, sid=sid)
+            # Each player's token travels alone in a tiny per-sid message;
+            # the shared transition payload goes out once below
+            sio_emit('your_token', {'playerToken': token}, room=sid)
         
         # Store expected players for this game
-        pending_game_players[game_id] = game_players
-        logger.info(f"✅ Stored pending players for game {game_id}: {game_players}")
-        logger.info(f"All pending games: {pending_game_players}")
-        logger.info(f"Player tokens after all updates: {player_tokens}")
-        logger.info(f"=== TOKEN UPDATE COMPLETE ===")
-        
-        # Update lobby status  
-        lobby['status'] = 'transitioning'
-        lobby['gameId'] = game_id
-        
-        # Move all players from lobby room to game room
-        for player in lobby['players']:
-            leave_room(f"lobby_{lobby_code}", sid=player['socketId'])
-            join_room(f"game_{game_id}", sid=player['socketId'])
-        
-        # Notify all players to transition to game room with their tokens
-        for player in lobby['players']:
-            logger.info(f"Sending transition event to {player['username']} with token {player['token']}")
-            socketio.emit('transition_to_game', {
-                'gameId': game_id,
-                'playerToken': player['token'],  # Send secure token
-                'message': 'Game created! Joining game room...'
-            }, room=player['socketId'])
-        
-        logger.info(f"Game {game_id} created for lobby {lobby_code}, players transitioning with tokens")
+        pending_game_players[game_id] = pending_players
+        if debug:
+            logger.debug("Stored pending players for game %s: %r", game_id, pending_players)
+            logger.debug("Player tokens after all updates: %r", tokens)
+        
+        # One broadcast to the game room everyone just joined, instead of a
+        # full per-sid copy of the same payload. Per-sid emits above are
+        # queued first, so each client holds its token before this arrives.
+        sio_emit('game_starting', {
+            'gameId': game_id,
+            'message': 'Game created! Joining game room...'
+        }, room=game_room)
+        
+        logger.info("Game %s created for lobby %s, players transitioning with tokens", game_id, lobby_code)
 
 # Export global state for access from other modules
-__all__ = ['active_lobbies', 'player_sessions', 'player_tokens', 'pending_game_players', 'register_lobby_events']
\ No newline at end of file
+__all__ = ['LobbyStore', 'Player', 'active_lobbies', 'player_sessions', 'player_tokens', 'pending_game_players', 'public_view', 'register_lobby_events']
\ No newline at end of file
@@ -0,0 +1,12 @@
+# orjson_shim.py - json-module stand-in for SocketIO backed by orjson
+# orjson serializes ~3-5x faster than stdlib json with fewer allocations,
+# which matters on the per-player game-state fan-outs. SocketIO passes
+# json-module kwargs like separators that orjson neither takes nor needs,
+# so both entry points swallow **kwargs.
+import orjson
+
+def dumps(obj, **kwargs):
+    return orjson.dumps(obj).decode()
+
+def loads(s, **kwargs):
+    return orjson.loads(s)
@@ -80,30 +80,43 @@ class PokerClient {
         });
 
         // Lobby room events
+        // Lobby mutation events carry diffs, not the full lobby -
+        // reconcile them into currentLobby locally
         this.socket.on('player_joined', (data) => {
-            this.currentLobby = data.lobby;
-            this.showMessage(data.message, 'success');
+            if (this.currentLobby) {
+                this.currentLobby.players.push(data.player);
+            }
+            this.showMessage(`${data.player.username} joined the lobby`, 'success');
             this.updatePlayersDisplay();
             this.updateStartButton();
         });
 
         this.socket.on('player_left', (data) => {
-            this.currentLobby = data.lobby;
-            this.showMessage(data.message, 'warning');
+            if (this.currentLobby) {
+                this.currentLobby.players = this.currentLobby.players.filter(
+                    p => p.socketId !== data.socketId);
+            }
+            this.showMessage('A player left the lobby', 'warning');
             this.updatePlayersDisplay();
             this.updateStartButton();
         });
 
         this.socket.on('player_ready_changed', (data) => {
-            this.currentLobby = data.lobby;
-            this.showMessage(data.message, 'success');
+            if (this.currentLobby) {
+                const player = this.currentLobby.players.find(
+                    p => p.socketId === data.socketId);
+                if (player) {
+                    player.isReady = data.isReady;
+                }
+            }
             this.updatePlayersDisplay();
             this.updateStartButton();
         });
 
         this.socket.on('lobby_config_updated', (data) => {
-            this.currentLobby = data.lobby;
-            this.showMessage(data.message, 'success');
+            if (this.currentLobby) {
+                Object.assign(this.currentLobby.config, data.config);
+            }
             this.updateSettingsDisplay();
         });
 
@@ -116,10 +129,16 @@ class PokerClient {
         });
 
         // Game transition events
-        this.socket.on('transition_to_game', (data) => {
-            console.log('Transitioning to game room:', data.gameId);
+        // The server sends each player their token individually, then one
+        // shared game_starting broadcast. The token always arrives first on
+        // this socket, so it's stored by the time the redirect fires.
+        this.socket.on('your_token', (data) => {
             // Store the secure token for game authentication
             localStorage.setItem('playerToken', data.playerToken);
+        });
+
+        this.socket.on('game_starting', (data) => {
+            console.log('Transitioning to game room:', data.gameId);
             // Redirect to game room (clean URL)
             window.location.href = `/game/${data.gameId}`;
         });
@@ -432,6 +451,17 @@ class PokerClient {
             startingFunds: startingFunds
         });
 
+        // The server skips us on the lobby_config_updated broadcast since
+        // we already know the values we just submitted
+        if (this.currentLobby) {
+            Object.assign(this.currentLobby.config, {
+                smallBlind: smallBlind,
+                bigBlind: bigBlind,
+                startingFunds: startingFunds
+            });
+            this.updateSettingsDisplay();
+        }
+
         this.hideSettingsEditor();
     }
 
@@ -66,13 +66,27 @@ class GameRoomClient {
             this.addActionLog(data.message, 'system');
         });
 
-        this.socket.on('game_started', (data) => {
+        this.socket.on('game_started_public', (data) => {
             console.log('Game started event received:', data);
             this.addActionLog('Game started!', 'important');
             this.gameState = data.gameState;
+            // Merge our private entry if it arrived before the public state
+            if (this.pendingPrivate && this.pendingPrivate.gameId === data.gameId) {
+                this.gameState.Players[this.pendingPrivate.playerIndex] = this.pendingPrivate.you;
+                this.pendingPrivate = null;
+            }
             this.updateGameDisplay();
         });
 
+        this.socket.on('game_started_private', (data) => {
+            if (this.gameState && this.gameState.Players) {
+                this.gameState.Players[data.playerIndex] = data.you;
+                this.updateGameDisplay();
+            } else {
+                this.pendingPrivate = data;
+            }
+        });
+
         this.socket.on('game_state_update', (data) => {
             this.gameState = data.gameState;
             this.updateGameDisplay();